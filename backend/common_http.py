@@ -4,15 +4,19 @@ Shared HTTP utilities:
 - Simple per-host rate limiting
 - robots.txt allow check with caching
 - URL sanitization helpers
+- DuckDuckGo HTML result parsing
 """
 
 from __future__ import annotations
 
+import re
 import time
 import threading
 from functools import lru_cache
-from typing import Optional
-from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from itertools import islice
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import ParseResult, urlparse, urlunparse, parse_qsl, urlencode
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -20,9 +24,11 @@ from urllib3.util.retry import Retry
 from urllib import robotparser
 
 from settings import (
-    ENABLE_HTTP_CACHE, CACHE_BACKEND_PATH, DEFAULT_TIMEOUT_SEC,
-    TOTAL_RETRIES, BACKOFF_FACTOR, PER_HOST_MAX_RPS, RESPECT_ROBOTS,
-    ROBOTS_TTL_SEC, USER_AGENT
+    ENABLE_HTTP_CACHE, CACHE_BACKEND_PATH, HTTP_CACHE_BACKEND, CROSSREF_CACHE_TTL_SEC,
+    DEFAULT_TIMEOUT_SEC,
+    TOTAL_RETRIES, BACKOFF_FACTOR, PER_HOST_MAX_RPS, PER_HOST_BURST,
+    PER_HOST_MAX_CONC, RESPECT_ROBOTS,
+    ROBOTS_TTL_SEC, ALWAYS_ALLOWED_HOSTS, USER_AGENT, MAX_CONTENT_LENGTH_BYTES
 )
 
 # ---- optional caching ----
@@ -33,13 +39,71 @@ try:
 except Exception:
     _CACHE_INSTALLED = False
 
+# ---- optional fast HTML parser ----
+try:
+    from selectolax.lexbor import LexborHTMLParser  # type: ignore
+    _LEXBOR_INSTALLED = True
+except Exception:
+    _LEXBOR_INSTALLED = False
+
 _SESSION_LOCK = threading.Lock()
 _SESSION: Optional[requests.Session] = None
 
-# Per-host rate limiting (simple "min interval between requests" model)
+# Per-host rate limiting (token bucket: refill at PER_HOST_MAX_RPS, hold up to PER_HOST_BURST)
 _HOST_LOCKS: dict[str, threading.Lock] = {}
-_LAST_HIT_TS: dict[str, float] = {}
-_MIN_INTERVAL = 1.0 / max(PER_HOST_MAX_RPS, 0.0001)  # guard div by zero
+_BUCKETS: dict[str, tuple[float, float]] = {}  # host -> (tokens, last refill, monotonic)
+_RATE = max(PER_HOST_MAX_RPS, 0.0001)  # guard div by zero
+_BURST = max(PER_HOST_BURST, 1.0)
+
+# Per-host cap on in-flight requests (the bucket above only spaces out start times)
+_HOST_SEMAPHORES: dict[str, threading.BoundedSemaphore] = {}
+
+# robots.txt parsers per origin: robots_url -> (parser, expiry on the monotonic clock)
+_ROBOTS_LOCK = threading.Lock()
+_ROBOTS: dict[str, tuple[robotparser.RobotFileParser, float]] = {}
+
+# Query keys dropped by clean_url (plus anything starting with utm_)
+_TRACKING_PARAMS = frozenset({"fbclid", "gclid", "ref"})
+
+# DuckDuckGo HTML endpoint used by the web & guideline retrievers
+# (query goes in params= so requests encodes it and the cache key is canonical)
+DDG_HTML = "https://duckduckgo.com/html/"
+# results sit at the top of the page; the tail is footer/markup we never parse
+DDG_MAX_BYTES = 512 * 1024
+
+# Source reputation weights (registrable domain -> prior), shared by the web
+# retriever's ranking (weight > 0 == reputable) and provenance scoring
+DOMAIN_WEIGHTS = MappingProxyType({
+    "who.int": 15,
+    "cdc.gov": 15,
+    "nih.gov": 12,
+    "cochranelibrary.com": 12,
+    "nejm.org": 12,
+    "thelancet.com": 12,
+    "bmj.com": 12,
+    "jama-network.com": 12,
+    "nature.com": 10,
+    "sciencemag.org": 10,
+    "ox.ac.uk": 8,
+    "harvard.edu": 8,
+    "stanford.edu": 8,
+    "reuters.com": 6,
+    "apnews.com": 6,
+    "bbc.com": 6,
+    "nytimes.com": 4,
+    "theguardian.com": 4,
+    "washingtonpost.com": 4,
+    "statnews.com": 4,
+})
+
+YEAR_RE = re.compile(r"\b(20\d{2}|19\d{2})\b")
+_TAG_RE = re.compile(r"<.*?>")
+# one alternation over both anchors so the page is scanned once
+_DDG_RE = re.compile(
+    r'<a[^>]*class="result__a"[^>]*href="(?P<href>[^"]+)"[^>]*>(?P<title>.*?)</a>'
+    r'|<a[^>]*class="result__snippet[^"]*"[^>]*>(?P<snippet>.*?)</a>',
+    flags=re.I | re.S,
+)
 
 def _install_retries(sess: requests.Session) -> None:
     retry = Retry(
@@ -49,7 +113,9 @@ def _install_retries(sess: requests.Session) -> None:
         allowed_methods=frozenset(["GET", "HEAD"]),
         raise_on_status=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # pool sized for the thread-pool fan-out in the retrievers/provenance scoring,
+    # so concurrent requests reuse keep-alive connections instead of dropping them
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=16, pool_maxsize=16)
     sess.mount("https://", adapter)
     sess.mount("http://", adapter)
 
@@ -66,11 +132,14 @@ def get_http_session() -> requests.Session:
             return _SESSION
 
         if ENABLE_HTTP_CACHE and _CACHE_INSTALLED:
-            # sqlite cache at CACHE_BACKEND_PATH
+            # sqlite cache at CACHE_BACKEND_PATH, or in-process when HTTP_CACHE_BACKEND=memory
             _SESSION = requests_cache.CachedSession(
                 CACHE_BACKEND_PATH,
+                backend=HTTP_CACHE_BACKEND,
                 allowable_methods=("GET", "HEAD"),
-                expire_after=60 * 60 * 6,  # 6 hours
+                expire_after=60 * 60 * 6,  # 6 hours (unless the server says otherwise)
+                urls_expire_after={"api.crossref.org": CROSSREF_CACHE_TTL_SEC},
+                cache_control=True,
                 stale_if_error=True,
             )
         else:
@@ -83,65 +152,118 @@ def get_http_session() -> requests.Session:
         _install_retries(_SESSION)
         return _SESSION
 
-def _host_lock(host: str) -> threading.Lock:
-    with _SESSION_LOCK:
-        if host not in _HOST_LOCKS:
-            _HOST_LOCKS[host] = threading.Lock()
-        return _HOST_LOCKS[host]
+@lru_cache(maxsize=4096)
+def _cached_urlparse(url: str) -> ParseResult:
+    # The same URL is parsed by clean_url, robots, rate limiting and domain()
+    # on every request; ParseResult is an immutable tuple so sharing is safe.
+    return urlparse(url)
 
 def rate_limit(url: str) -> None:
     """
-    Enforces a minimal interval between requests per host.
+    Per-host token bucket. A token is reserved under the host lock (the
+    balance may go negative) and the matching wait is slept outside it,
+    so concurrent callers queue up without serializing on time.sleep().
     """
-    host = urlparse(url).netloc.lower()
-    lock = _host_lock(host)
+    host = _cached_urlparse(url).netloc.lower()
+    lock = _HOST_LOCKS.setdefault(host, threading.Lock())  # atomic, no global lock
     with lock:
-        last = _LAST_HIT_TS.get(host, 0.0)
-        wait = _MIN_INTERVAL - (time.time() - last)
-        if wait > 0:
-            time.sleep(wait)
-        _LAST_HIT_TS[host] = time.time()
+        now = time.monotonic()
+        tokens, last = _BUCKETS.get(host, (_BURST, now))
+        tokens = min(_BURST, tokens + (now - last) * _RATE) - 1.0
+        _BUCKETS[host] = (tokens, now)
+    if tokens < 0:
+        time.sleep(-tokens / _RATE)
+
+def _host_slots(url: str) -> threading.BoundedSemaphore:
+    host = _cached_urlparse(url).netloc.lower()
+    return _HOST_SEMAPHORES.setdefault(host, threading.BoundedSemaphore(max(PER_HOST_MAX_CONC, 1)))
 
 def clean_url(url: str) -> str:
     """
     Strip common tracking params (utm_*, fbclid, gclid, ref) for dedupe & privacy.
     """
-    parsed = urlparse(url)
+    parsed = _cached_urlparse(url)
     query = [(k, v) for (k, v) in parse_qsl(parsed.query, keep_blank_values=True)
-             if not (k.startswith("utm_") or k in {"fbclid", "gclid", "ref"})]
+             if not (k.startswith("utm_") or k in _TRACKING_PARAMS)]
     new_query = urlencode(query, doseq=True)
     return urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, new_query, parsed.fragment))
 
-@lru_cache(maxsize=512)
-def _load_robot_parser(base_url: str) -> robotparser.RobotFileParser:
+def domain(url: str) -> str:
+    """
+    Lower-cased host of a URL ("" if it cannot be parsed).
+    """
+    try:
+        return _cached_urlparse(url).netloc.lower()
+    except Exception:
+        return ""
+
+def domain_weight(host: str) -> int:
+    """
+    DOMAIN_WEIGHTS prior for a host or any parent domain (www.who.int -> who.int),
+    0 if unknown. One dict lookup per label.
+    """
+    while host:
+        weight = DOMAIN_WEIGHTS.get(host)
+        if weight is not None:
+            return weight
+        host = host.partition(".")[2]
+    return 0
+
+def guess_year(text: str) -> Optional[int]:
+    """
+    First plausible 19xx/20xx year mentioned in text, if any.
+    """
+    if not text:
+        return None
+    m = YEAR_RE.search(text)
+    # YEAR_RE only matches 19xx/20xx digits, so int() cannot fail and is in range
+    return int(m.group(1)) if m else None
+
+def _load_robot_parser(robots_url: str) -> robotparser.RobotFileParser:
+    """
+    Parsed robots.txt for an origin, re-fetched once ROBOTS_TTL_SEC has passed.
+    """
+    now = time.monotonic()
+    with _ROBOTS_LOCK:
+        hit = _ROBOTS.get(robots_url)
+    if hit is not None and now < hit[1]:
+        return hit[0]
+
     rp = robotparser.RobotFileParser()
-    rp.set_url(base_url)
+    rp.set_url(robots_url)
     try:
         rp.read()
     except Exception:
         # On failure, be conservative: disallow only if parser loads and says so
         pass
+    with _ROBOTS_LOCK:
+        _ROBOTS[robots_url] = (rp, now + ROBOTS_TTL_SEC)
     return rp
 
-@lru_cache(maxsize=2048)
 def is_allowed_by_robots(url: str, user_agent: str = USER_AGENT) -> bool:
     if not RESPECT_ROBOTS:
         return True
     try:
-        parsed = urlparse(url)
+        parsed = _cached_urlparse(url)
+        if parsed.netloc.lower() in ALWAYS_ALLOWED_HOSTS:
+            return True
         robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
         rp = _load_robot_parser(robots_url)
-        # robotparser has no TTL; emulate by time-based cache busting via dummy arg
-        # (we rely on lru_cache eviction over time as a pragmatic compromise).
         return rp.can_fetch(user_agent, url)
     except Exception:
         # On errors, default to allow (like most clients do), but you can flip this if desired.
         return True
 
-def safe_get(url: str, timeout: float = DEFAULT_TIMEOUT_SEC, allow_non_200: bool = False) -> Optional[requests.Response]:
+def safe_get(url: str, timeout: float = DEFAULT_TIMEOUT_SEC, allow_non_200: bool = False,
+             params: Optional[Dict[str, str]] = None,
+             max_bytes: Optional[int] = None) -> Optional[requests.Response]:
     """
-    HEAD -> check content length -> GET. Returns response or None.
-    Applies robots & rate limit.
+    Streaming GET with a MAX_CONTENT_LENGTH_BYTES body cap. Returns response or None.
+    With max_bytes, only that many leading bytes are kept (truncated, not rejected)
+    for callers that only need the top of a page.
+    Applies robots & rate limit, and holds one of the host's PER_HOST_MAX_CONC
+    slots while the request is in flight. DDG HTML is a single host, so this
+    is what bounds the retrievers' search fan-out.
     """
     if not url:
         return None
@@ -154,21 +276,105 @@ def safe_get(url: str, timeout: float = DEFAULT_TIMEOUT_SEC, allow_non_200: bool
 
     rate_limit(url)
 
+    with _host_slots(url):
+        return _get_capped(session, url, timeout, allow_non_200, params, max_bytes)
+
+def read_capped(r: requests.Response, max_bytes: int, truncate: bool = False) -> Optional[bytes]:
+    """
+    Reads a streamed body, giving up (and closing) once it exceeds max_bytes,
+    or, with truncate=True, returning just the first max_bytes.
+    """
+    chunks: List[bytes] = []
+    size = 0
     try:
-        # quick HEAD probe (not all servers support it gracefully; ignore failures)
-        h = session.head(url, timeout=timeout, allow_redirects=True)
-        # Guard against huge downloads when server advertises size
-        clen = h.headers.get("Content-Length")
-        if clen is not None and clen.isdigit():
-            if int(clen) > 2_500_000:  # 2.5 MB cap to be polite
-                return None
+        for chunk in r.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                r.close()
+                if not truncate:
+                    return None
+                chunks.append(chunk[:len(chunk) - (size - max_bytes)])
+                break
+            chunks.append(chunk)
     except Exception:
-        pass
+        r.close()
+        return None
+    return b"".join(chunks)
 
+def _get_capped(session: requests.Session, url: str, timeout: float,
+                allow_non_200: bool, params: Optional[Dict[str, str]] = None,
+                max_bytes: Optional[int] = None) -> Optional[requests.Response]:
+    # One streamed GET instead of HEAD + GET: the size check uses the real
+    # response headers, and bodies without Content-Length are counted as read.
     try:
-        r = session.get(url, timeout=timeout, allow_redirects=True)
-        if not allow_non_200 and r.status_code != 200:
-            return None
-        return r
+        r = session.get(url, params=params, timeout=timeout, allow_redirects=True, stream=True)
     except Exception:
         return None
+    if not allow_non_200 and r.status_code != 200:
+        r.close()
+        return None
+
+    if max_bytes is not None:
+        body = read_capped(r, min(max_bytes, MAX_CONTENT_LENGTH_BYTES), truncate=True)
+    else:
+        clen = r.headers.get("Content-Length")
+        if clen is not None and clen.isdigit() and int(clen) > MAX_CONTENT_LENGTH_BYTES:
+            r.close()
+            return None
+        body = read_capped(r, MAX_CONTENT_LENGTH_BYTES)
+    if body is None:
+        return None
+    # hand back a normal, fully-read Response (what .content would have built).
+    # Deliberately relies on requests internals: Response.content/.text read
+    # _content once _content_consumed is set (checked with requests 2.x and
+    # requests_cache's CachedSession); revisit if either changes how bodies load.
+    r._content = body
+    r._content_consumed = True
+    return r
+
+def parse_ddg(html: str, max_results: int = 10) -> List[Dict]:
+    """
+    Lightweight parse of DDG HTML results into {title, url, snippet} dicts
+    (Lexbor when available, single-pass regex otherwise).
+    """
+    return list(islice(iter_ddg(html), max_results))
+
+def iter_ddg(html: str) -> Iterator[Dict]:
+    """
+    Lazily yields DDG hits in page order, so callers can stop early.
+    """
+    if _LEXBOR_INSTALLED:
+        return _iter_ddg_lexbor(html)
+    return _iter_ddg_regex(html)
+
+def _iter_ddg_lexbor(html: str) -> Iterator[Dict]:
+    tree = LexborHTMLParser(html)
+    # each hit is a <div class="result"> holding one result__a and (maybe) one result__snippet
+    for res in tree.css(".result"):
+        a = res.css_first(".result__a")
+        if a is None:
+            continue
+        url = clean_url(a.attributes.get("href") or "")
+        title = a.text().strip()
+        if not title or not url.startswith(("http://", "https://")):
+            continue
+        sn = res.css_first(".result__snippet")
+        snippet = sn.text().strip() if sn is not None else ""
+        yield {"title": title, "url": url, "snippet": snippet}
+
+def _iter_ddg_regex(html: str) -> Iterator[Dict]:
+    pending: Optional[Dict] = None
+    # single pass: a result__snippet belongs to the result__a that precedes it
+    for m in _DDG_RE.finditer(html):
+        if m.group("href") is not None:
+            if pending is not None:
+                yield pending
+            pending = None
+            url = clean_url(m.group("href"))
+            title = _TAG_RE.sub("", m.group("title")).strip()
+            if title and url.startswith(("http://", "https://")):
+                pending = {"title": title, "url": url, "snippet": ""}
+        elif pending is not None and not pending["snippet"]:
+            pending["snippet"] = _TAG_RE.sub("", m.group("snippet")).strip()
+    if pending is not None:
+        yield pending
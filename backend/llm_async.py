@@ -0,0 +1,41 @@
+"""
+Shared AsyncOpenAI access for the async router/synthesizer entry points:
+- one client (connection pool) per event loop, created on first use
+- LLM_MAX_CONCURRENCY caps in-flight completions per loop (OpenAI rate limits)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import weakref
+from typing import Any
+
+from openai import AsyncOpenAI
+
+from settings import LLM_MAX_CONCURRENCY
+
+# the client's HTTP pool and the semaphore both belong to the loop that made them,
+# so keep one pair per loop (separate asyncio.run calls get fresh ones)
+_PER_LOOP: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[AsyncOpenAI, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _for_loop() -> "tuple[AsyncOpenAI, asyncio.Semaphore]":
+    loop = asyncio.get_running_loop()
+    pair = _PER_LOOP.get(loop)
+    if pair is None:
+        pair = (AsyncOpenAI(), asyncio.Semaphore(max(LLM_MAX_CONCURRENCY, 1)))
+        _PER_LOOP[loop] = pair
+    return pair
+
+
+async def chat_text(**kwargs: Any) -> str:
+    """
+    Awaits client.chat.completions.create(**kwargs) under the concurrency cap and
+    returns the stripped message text.
+    """
+    client, sem = _for_loop()
+    async with sem:
+        resp = await client.chat.completions.create(**kwargs)
+    return resp.choices[0].message.content.strip()
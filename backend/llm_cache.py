@@ -0,0 +1,80 @@
+"""
+Exact-match cache for chat completions:
+- key = blake2b of (model, temperature, system prompt, user prompt)
+- stored in a sqlite table (survives restarts); no in-process tier of its own, the
+  router's route memo already holds hot routes and synthesis repeats are rare
+- entries expire after LLM_CACHE_TTL_SEC
+- ENABLE_LLM_CACHE=0 turns it off
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from settings import ENABLE_LLM_CACHE, LLM_CACHE_PATH, LLM_CACHE_TTL_SEC
+
+_LOCK = threading.Lock()
+_DB: Optional[sqlite3.Connection] = None
+
+
+def make_key(model: str, system: str, user: str, temperature: float) -> str:
+    raw = f"{model}|{temperature}|{system}|{user}".encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=20).hexdigest()
+
+
+def _db() -> Optional[sqlite3.Connection]:
+    """
+    Shared connection (created on first use); callers hold _LOCK.
+    None if the database can't be opened, in which case nothing is cached.
+    """
+    global _DB
+    if _DB is None:
+        try:
+            _DB = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+            _DB.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, text TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            _DB.commit()
+        except sqlite3.Error:
+            _DB = None
+    return _DB
+
+
+def get_cached(key: str) -> Optional[str]:
+    if not ENABLE_LLM_CACHE:
+        return None
+    now = time.time()
+    with _LOCK:
+        db = _db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT text FROM completions WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row is not None else None
+
+
+def put_cached(key: str, text: str) -> None:
+    if not ENABLE_LLM_CACHE:
+        return
+    expires = time.time() + LLM_CACHE_TTL_SEC
+    with _LOCK:
+        db = _db()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO completions (key, text, expires) VALUES (?, ?, ?)",
+                (key, text, expires),
+            )
+            db.commit()
+        except sqlite3.Error:
+            pass
@@ -1,5 +1,6 @@
 # backend/main_agent.py
-import os, sys, re
+import os, sys, re, logging
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from backend.router_agent import route_query
@@ -9,9 +10,23 @@ from backend.blog_news_retriever import web_search_duckduckgo
 from backend.provenance_validator import assess_items
 from backend.synthesizer import synthesize
 from backend.validator import validate
+# same top-level module the retrievers import, so there is one copy of its
+# session/caches (backend.common_http would be a second module object)
+from common_http import clean_url
+
+# per-source listings go to this logger at DEBUG (enable with DIAG=1 on the CLI)
+log = logging.getLogger(__name__)
 
 # ---------------- helpers ----------------
 
+def _diag(header: str, lines) -> None:
+    """
+    Logs one diagnostic block as a single record. `lines` may be a generator;
+    it is only consumed (and formatted) when DEBUG is enabled.
+    """
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("\n".join([f"\n--- {header} ---", *lines]))
+
 def ask_for_clarification_if_needed(route, user_query: str):
     """
     If router provided clarify prompts, ask user interactively and re-route.
@@ -29,11 +44,15 @@ def ask_for_clarification_if_needed(route, user_query: str):
         return route_query(combined)
     return route
 
+_COMPARE_WORDS_RE = re.compile(r"\b(compare|versus|vs\.?)\b", re.I)
+_BETWEEN_RE = re.compile(r"\bbetween\b", re.I)
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
+
 def _strip_compare_words(q: str) -> str:
     # remove leading “compare/versus/compare … between … and …” to broaden web search
-    q = re.sub(r"\b(compare|versus|vs\.?)\b", "", q, flags=re.I).strip()
-    q = re.sub(r"\bbetween\b", "", q, flags=re.I).strip()
-    q = re.sub(r"\s{2,}", " ", q)
+    q = _COMPARE_WORDS_RE.sub("", q).strip()
+    q = _BETWEEN_RE.sub("", q).strip()
+    q = _MULTI_SPACE_RE.sub(" ", q)
     return q
 
 def _broaden_query(base: str, route) -> list[str]:
@@ -48,18 +67,63 @@ def _broaden_query(base: str, route) -> list[str]:
     alt3 = "infant immunization schedule WHO CDC"
     return [alt1, alt2, alt3]
 
+def _broadened_web_search(route) -> tuple[list, str | None]:
+    """
+    2nd-chance web search: first hit list from the broadened queries, plus a note.
+    """
+    for alt in _broaden_query(route.clean_query, route):
+        web_hits = web_search_duckduckgo(alt, max_results=5)
+        if web_hits:
+            return web_hits, f"Broadened web query used: “{alt}”."
+    return [], None
+
+def _dedupe_items(items: list[dict]) -> list[dict]:
+    """
+    Collapse repeats of the same normalized URL across retrievers (a WHO page is
+    often both a guideline and a web hit) so each page is scored/fetched once.
+    Keeps the first occurrence, with `source_types` listing every retriever that
+    returned it. URL-less NOTE rows are always kept.
+    """
+    seen: dict[str, dict] = {}
+    out: list[dict] = []
+    for it in items:
+        key = clean_url(it.get("url") or "")
+        first = seen.get(key) if key else None
+        if first is None:
+            it["source_types"] = [it.get("source_type")]
+            if key:
+                seen[key] = it
+            out.append(it)
+        elif it.get("source_type") not in first["source_types"]:
+            first["source_types"].append(it.get("source_type"))
+    return out
+
+def _paper_items(papers) -> list[dict]:
+    """
+    Item dicts for DocItem papers (PICO results and guideline support papers).
+    """
+    return [{
+        "source_type": "paper",
+        "title": d.title, "snippet": d.snippet, "year": d.year,
+        "url": d.url, "org": None, "study_type": d.study_type,
+        "population": d.population
+    } for d in papers]
+
 def _enrich_and_summarize(route, items):
+    items = _dedupe_items(items)
+
     # Reliability assessment (adds reliability_score/label/reasons)
     items_scored = assess_items(items)
 
-    # diagnostic: print reliability reasons for each item (console)
-    print("\n--- SOURCE RELIABILITY (diagnostic) ---")
-    for it in items_scored:
-        print(f"- [{it.get('reliability_label')}] {it.get('title')}")
-        reasons = it.get("reliability_reasons") or []
-        if reasons:
-            for r in reasons:
-                print("   -", r)
+    # diagnostic: reliability reasons for each item
+    _diag("SOURCE RELIABILITY (diagnostic)", (
+        line
+        for it in items_scored
+        for line in (
+            f"- [{it.get('reliability_label')}] {it.get('title')}",
+            *(f"   - {r}" for r in it.get("reliability_reasons") or []),
+        )
+    ))
 
     # Synthesize
     result = synthesize(
@@ -76,12 +140,11 @@ def _enrich_and_summarize(route, items):
     # Validate synthesized text
     val = validate(result["summary_block"], items_scored, time_horizon_years=route.time_horizon_years)
 
-    print("\n--- VALIDATED OUTPUT ---\n")
-    print(val["validated_text"])
+    out = ["\n--- VALIDATED OUTPUT ---\n", val["validated_text"]]
     if val["issues"]:
-        print("\n(validator notes)")
-        for i in val["issues"]:
-            print("-", i)
+        out.append("\n(validator notes)")
+        out.extend(f"- {i}" for i in val["issues"])
+    print("\n".join(out))
     return val
 
 # ---------------- main pipeline ----------------
@@ -89,8 +152,7 @@ def _enrich_and_summarize(route, items):
 def run_pipeline(user_query: str):
     # initial route
     route = route_query(user_query)
-    print("\n--- ROUTER OUTPUT ---")
-    print(route)
+    _diag("ROUTER OUTPUT", (str(route) for _ in (0,)))
 
     # interactive clarification loop:
     route = ask_for_clarification_if_needed(route, user_query)
@@ -103,86 +165,91 @@ def run_pipeline(user_query: str):
             outcomes=route.outcomes,
             k=6,
         )
-        print("\n--- PAPERS ---")
-        for d in papers:
-            print(f"- {d.year} | {d.study_type or 'Study'} | {d.title} -> {d.url}")
+        _diag("PAPERS", (f"- {d.year} | {d.study_type or 'Study'} | {d.title} -> {d.url}" for d in papers))
 
-        items = [{
-            "source_type": "paper",
-            "title": d.title, "snippet": d.snippet, "year": d.year,
-            "url": d.url, "org": None, "study_type": d.study_type,
-            "population": d.population
-        } for d in papers]
+        items = _paper_items(papers)
 
         return _enrich_and_summarize(route, items)
 
     elif route.task_type == "GUIDELINE_COMPARE":
+        # Guidelines, support papers and web hits hit independent services,
+        # so fetch them concurrently and report in the usual order afterwards.
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            f_guides = ex.submit(
+                fetch_guidelines_for_query,
+                query=route.clean_query,
+                max_results=6,  # ~3 per site (WHO, CDC)
+            )
+            f_support = ex.submit(
+                retrieve_pico_papers,
+                clean_query=route.clean_query,
+                time_horizon_years=route.time_horizon_years,
+                population=route.population,
+                outcomes=route.outcomes,
+                k=2,
+            ) if route.need_supporting_evidence else None
+            f_web = ex.submit(web_search_duckduckgo, route.clean_query, max_results=3)
+
+            guides = f_guides.result()
+            support_papers = f_support.result() if f_support else []
+            web_hits = f_web.result()
+
         # 1) Guidelines (never empty)
-        guides = fetch_guidelines_for_query(
-            clean_query=route.clean_query,
-            geography=route.geography,
-            k_per_site=3,
-        )
-        print("\n--- GUIDELINES (initial search) ---")
-        for g in guides:
-            print(f"- {g.org} {g.year or ''} | {g.title} -> {g.url}")
+        _diag("GUIDELINES (initial search)", (
+            f"- {g['org']} {g['year'] or ''} | {g['title']} -> {g['url']}" for g in guides
+        ))
 
+        # Second chances (broader guideline search, broadened web queries) are
+        # also independent of each other, so run whichever are needed together.
         fallback_note = None
-        if not guides:
-            print("\nNo WHO/CDC guidelines found for the exact query. Performing a broader guideline search...")
-            guides = fetch_guidelines_for_query(
-                clean_query=route.clean_query,
-                geography=None,
-                k_per_site=6,
-            )
-            fallback_note = (
-                "No direct WHO/CDC guideline matched the exact query — "
-                "broader search used; add age/region keywords to improve precision."
-            )
+        web_note = None
+        if not guides or not web_hits:
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                f_guides = f_web = None
+                if not guides:
+                    print("\nNo WHO/CDC guidelines found for the exact query. Performing a broader guideline search...")
+                    # broader = compare/between wording dropped, more hits (~6 per site)
+                    f_guides = ex.submit(
+                        fetch_guidelines_for_query,
+                        query=_strip_compare_words(route.clean_query),
+                        max_results=12,
+                    )
+                    fallback_note = (
+                        "No direct WHO/CDC guideline matched the exact query — "
+                        "broader search used; add age/region keywords to improve precision."
+                    )
+                if not web_hits:
+                    print("\nNo relevant blogs/news for the exact query. Trying broader web queries...")
+                    f_web = ex.submit(_broadened_web_search, route)
 
-        print("\n--- GUIDELINES (final) ---")
-        for g in guides:
-            print(f"- {g.org} {g.year or ''} | {g.title} -> {g.url}")
+                if f_guides:
+                    guides = f_guides.result()
+                if f_web:
+                    web_hits, web_note = f_web.result()
+
+        _diag("GUIDELINES (final)", (
+            f"- {g['org']} {g['year'] or ''} | {g['title']} -> {g['url']}" for g in guides
+        ))
 
         # 2) Support papers
-        support_papers = []
         if route.need_supporting_evidence:
-            support_papers = retrieve_pico_papers(
-                clean_query=route.clean_query,
-                time_horizon_years=route.time_horizon_years,
-                population=route.population,
-                outcomes=route.outcomes,
-                k=2,
-            )
-            print("\n--- SUPPORTING PAPERS ---")
-            for s in support_papers:
-                print(f"- {s.year} | {s.study_type or 'Study'} | {s.title} -> {s.url}")
+            _diag("SUPPORTING PAPERS", (
+                f"- {s.year} | {s.study_type or 'Study'} | {s.title} -> {s.url}" for s in support_papers
+            ))
 
         # 3) Web (blogs/news) with retry + note (never empty)
-        web_hits = web_search_duckduckgo(route.clean_query, k=3)
-        web_note = None
-        if not web_hits:
-            print("\nNo relevant blogs/news for the exact query. Trying broader web queries...")
-            for alt in _broaden_query(route.clean_query, route):
-                web_hits = web_search_duckduckgo(alt, k=5)
-                if web_hits:
-                    web_note = f"Broadened web query used: “{alt}”."
-                    break
-
-        print("\n--- WEB (blogs/news) ---")
-        if web_hits:
-            for w in web_hits:
-                print(f"- {w.year or ''} | {w.org} | {w.title} -> {w.url}")
-        else:
-            print("- (no hits after broadening)")
+        _diag("WEB (blogs/news)", (
+            (f"- {w['year'] or ''} | {w['org']} | {w['title']} -> {w['url']}" for w in web_hits)
+            if web_hits else ["- (no hits after broadening)"]
+        ))
 
         # 4) Build items (insert NOTE rows if needed so synthesizer always has context)
         items = []
         if guides:
             items.extend([{
                 "source_type": "guideline",
-                "title": g.title, "snippet": g.snippet, "year": g.year,
-                "url": g.url, "org": g.org
+                "title": g["title"], "snippet": g["snippet"], "year": g["year"],
+                "url": g["url"], "org": g["org"]
             } for g in guides])
         else:
             items.append({
@@ -192,18 +259,13 @@ def run_pipeline(user_query: str):
                 "year": None, "url": "", "org": "NOTE"
             })
 
-        items.extend([{
-            "source_type": "paper",
-            "title": s.title, "snippet": s.snippet, "year": s.year,
-            "url": s.url, "org": None, "study_type": s.study_type,
-            "population": s.population
-        } for s in support_papers])
+        items.extend(_paper_items(support_papers))
 
         if web_hits:
             items.extend([{
                 "source_type": "web",
-                "title": w.title, "snippet": w.snippet, "year": w.year,
-                "url": w.url, "org": w.org
+                "title": w["title"], "snippet": w["snippet"], "year": w["year"],
+                "url": w["url"], "org": w["org"]
             } for w in web_hits])
         else:
             items.append({
@@ -221,5 +283,9 @@ def run_pipeline(user_query: str):
 
 if __name__ == "__main__":
     import sys
+    # DIAG=1 prints the router output and per-source listings as before
+    logging.basicConfig(format="%(message)s")
+    if os.environ.get("DIAG") == "1":
+        log.setLevel(logging.DEBUG)
     q = " ".join(sys.argv[1:]) or "Compare infant vaccination schedules between WHO and CDC"
     run_pipeline(q)
@@ -9,79 +9,101 @@ Provenance scoring now fetches pages through the shared HTTP utilities:
 from __future__ import annotations
 
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
-from urllib.parse import urlparse
 
-from common_http import safe_get, clean_url
+from common_http import safe_get, clean_url, domain, domain_weight
 from settings import DEFAULT_TIMEOUT_SEC
 
-# --- your existing reputation & feature heuristics (kept) ---
-REPUTABLE_HINTS = {
-    "who.int": 15,
-    "cdc.gov": 15,
-    "nih.gov": 12,
-    "cochranelibrary.com": 12,
-    "nejm.org": 12,
-    "thelancet.com": 12,
-    "bmj.com": 12,
-    "jama-network.com": 12,
-    "nature.com": 10,
-    "sciencemag.org": 10,
-    "ox.ac.uk": 8,
-    "harvard.edu": 8,
-    "stanford.edu": 8,
-    "reuters.com": 6,
-    "apnews.com": 6,
-    "bbc.com": 6,
-    "nytimes.com": 4,
-    "theguardian.com": 4,
-}
-
-C2PA_RE = re.compile(r'c2pa|content authenticity', re.I)
+# parallel page fetches in assess_items
+MAX_WORKERS = 8
+
+# matched as plain substrings of the lower-cased page: a case-insensitive regex
+# alternation walks the whole body in Python's re engine, str.find does not
+C2PA_MARKERS = ("c2pa", "content authenticity")
 DATE_RE = re.compile(r'\b(20\d{2}|19\d{2})\b')
 AUTHOR_RE = re.compile(r'By\s+[A-Z][\w\-\.\s]{1,40}', re.I)
 
+# links the HTML heuristics below cannot read; scored on domain alone
+SKIP_FETCH_EXTS = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip")
 
-def _domain(url: str) -> str:
-    try:
-        return urlparse(url).netloc.lower()
-    except Exception:
-        return ""
+# only the top of a page is scored; safe_get stops reading after this many bytes
+PAGE_MAX_BYTES = 200_000
+
+# in-process page-text memo (url -> text), most recently used last
+TEXT_CACHE_MAX = 512
+_TEXT_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_TEXT_CACHE_LOCK = threading.Lock()
 
 
 def _fetch_text(url: str) -> str:
-    r = safe_get(url, timeout=DEFAULT_TIMEOUT_SEC, allow_non_200=False)
+    """
+    Page text for scoring. Successful fetches are memoized in-process (LRU) on
+    top of the on-disk HTTP cache; failures/empty bodies are not, so a
+    transient 5xx is retried next time instead of being remembered.
+    """
+    with _TEXT_CACHE_LOCK:
+        hit = _TEXT_CACHE.get(url)
+        if hit is not None:
+            _TEXT_CACHE.move_to_end(url)
+            return hit
+
+    text = _fetch_text_uncached(url)
+    if text:
+        with _TEXT_CACHE_LOCK:
+            _TEXT_CACHE[url] = text
+            if len(_TEXT_CACHE) > TEXT_CACHE_MAX:
+                _TEXT_CACHE.popitem(last=False)
+    return text
+
+
+def _fetch_text_uncached(url: str) -> str:
+    r = safe_get(url, timeout=DEFAULT_TIMEOUT_SEC, allow_non_200=False,
+                 max_bytes=PAGE_MAX_BYTES)
     if not r:
         return ""
-    # keep it light; large pages trimmed upstream by size guard
     content_type = r.headers.get("Content-Type", "").lower()
     if "html" not in content_type and "xml" not in content_type:
         return ""
-    try:
-        r.encoding = r.apparent_encoding or r.encoding
-    except Exception:
-        pass
-    return (r.text or "")[:200_000]  # hard safety cap
-
-
-def _score_item(it: Dict) -> Dict:
-    url = clean_url(it.get("url", "") or "")
-    dom = _domain(url)
+    # charset sniffing (apparent_encoding) scans the whole body in Python;
+    # only fall back to it when the server did not declare a charset
+    if "charset=" not in content_type:
+        try:
+            r.encoding = r.apparent_encoding or r.encoding
+        except Exception:
+            pass
+    return r.text or ""
+
+
+def _should_fetch(it: Dict, url: str) -> bool:
+    # placeholders, non-http links and document downloads would only be
+    # rejected by _fetch_text's content-type check after the transfer
+    if not url or it.get("org") == "NOTE":
+        return False
+    if not url.startswith(("http://", "https://")):
+        return False
+    path = url.split("#", 1)[0].split("?", 1)[0].lower()
+    return not path.endswith(SKIP_FETCH_EXTS)
+
+
+def _score_item(it: Dict, url: str, body: str) -> Dict:
+    dom = domain(url)
 
     score = 0
     reasons: List[str] = []
 
-    # domain prior
-    if dom in REPUTABLE_HINTS:
-        score += REPUTABLE_HINTS[dom]
-        reasons.append(f"Reputable domain: {dom} (+{REPUTABLE_HINTS[dom]})")
-
-    # fetch body (polite)
-    body = _fetch_text(url)
+    # domain prior (shared DOMAIN_WEIGHTS)
+    weight = domain_weight(dom)
+    if weight:
+        score += weight
+        reasons.append(f"Reputable domain: {dom} (+{weight})")
 
     if body:
         # C2PA / authenticity markers
-        if C2PA_RE.search(body):
+        body_lower = body.lower()
+        if any(m in body_lower for m in C2PA_MARKERS):
             score += 6
             reasons.append("Claims content authenticity / C2PA (+6)")
 
@@ -101,14 +123,25 @@ def _score_item(it: Dict) -> Dict:
 
     # normalize & label
     label = "High" if score >= 18 else "Medium" if score >= 10 else "Low"
-    out = dict(it)
-    out.update({
-        "reliability_score": score,
-        "reliability_label": label,
-        "reliability_reasons": reasons,
-    })
-    return out
+    # annotate in place: callers build these dicts for this pass only
+    it["reliability_score"] = score
+    it["reliability_label"] = label
+    it["reliability_reasons"] = reasons
+    return it
 
 
 def assess_items(items: List[Dict]) -> List[Dict]:
-    return [_score_item(it) for it in (items or [])]
+    items = items or []
+    urls = [clean_url(it.get("url", "") or "") for it in items]
+
+    # fetch each distinct page once (the same URL often comes from several
+    # retrievers) on a thread pool; safe_get caps in-flight requests per host
+    todo = list(dict.fromkeys(u for it, u in zip(items, urls) if _should_fetch(it, u)))
+    bodies: Dict[str, str] = {}
+    if len(todo) == 1:
+        bodies[todo[0]] = _fetch_text(todo[0])
+    elif todo:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(todo))) as ex:
+            bodies = dict(zip(todo, ex.map(_fetch_text, todo)))
+
+    return [_score_item(it, url, bodies.get(url, "")) for it, url in zip(items, urls)]
@@ -1,14 +1,47 @@
 # backend/retriever.py
 from __future__ import annotations
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
-import requests, time, re
+import hashlib, json, threading, time, re
+from collections import Counter
+from concurrent.futures import Future
 from datetime import datetime
 
+from common_http import get_http_session, read_capped
+from settings import DEFAULT_TIMEOUT_SEC, MAX_CONTENT_LENGTH_BYTES
+
+# ---- optional fast JSON ----
+try:
+    import orjson  # type: ignore
+    _ORJSON_INSTALLED = True
+except Exception:
+    _ORJSON_INSTALLED = False
+
 CROSSREF_URL = "https://api.crossref.org/works"
 UA = "infant-health-agent/0.1 (mailto:veerakrisha123@gmail.com)"  
 
-@dataclass
+_WORD_RE = re.compile(r"[0-9a-z]+")
+# British -> US spelling folds applied per word before hashing (randomised,
+# diarrhoea, paediatric, behaviour); plain 3-gram SimHash left these 9-13 bits apart
+_SPELLING_FOLDS = (
+    (re.compile(r"(?<=[a-z])is(e|ed|es|ing|ation|ations)$"), r"iz\1"),
+    (re.compile(r"(?<=[a-z])(?:oe|ae)(?=[a-z])"), "e"),
+    (re.compile(r"(?<=[a-z]{2})our$"), "or"),
+)
+_TITLE_STOPWORDS = frozenset("a an the of in on for and to with by at from".split())
+_TAG_RE = re.compile(r"<.*?>")
+_PREPRINT_RE = re.compile(r"medrxiv|biorxiv|arxiv")
+# one scan for every study-design keyword; groups are in priority order, so
+# the lowest matched group index is the label (see _STUDY_LABELS)
+_STUDY_RE = re.compile(
+    r"(?P<rct>randomi[sz]ed|\brct\b)"
+    r"|(?P<meta>meta-analysis|systematic review)"
+    r"|(?P<cohort>cohort|prospective|retrospective)"
+    r"|(?P<case_control>case-control)"
+)
+_STUDY_LABELS = (None, "RCT", "Meta-analysis", "Cohort", "Case-control")
+
+@dataclass(slots=True)
 class DocItem:
     source_type: str       
     title: str
@@ -21,6 +54,21 @@ class DocItem:
     population: Optional[str] = None
     is_preprint: bool = False
 
+    def to_dict(self) -> dict:
+        # flat fields only, so a literal dict beats asdict()'s recursive deepcopy
+        return {
+            "source_type": self.source_type,
+            "title": self.title,
+            "snippet": self.snippet,
+            "year": self.year,
+            "url": self.url,
+            "org": self.org,
+            "doi": self.doi,
+            "study_type": self.study_type,
+            "population": self.population,
+            "is_preprint": self.is_preprint,
+        }
+
 def _year_filter(from_year: int) -> Dict[str, Any]:
     return {
         "filter": f"from-pub-date:{from_year}-01-01",
@@ -28,57 +76,113 @@ def _year_filter(from_year: int) -> Dict[str, Any]:
 
 def _study_type_from(title: str, abstract: str) -> Optional[str]:
     text = f"{title} {abstract}".lower()
-    if any(k in text for k in ["randomized", "randomised", "randomized controlled", "rct"]):
-        return "RCT"
-    if "meta-analysis" in text or "systematic review" in text:
-        return "Meta-analysis"
-    if any(k in text for k in ["cohort", "prospective", "retrospective"]):
-        return "Cohort"
-    if "case-control" in text:
-        return "Case-control"
-    return None
+    best = 0
+    for m in _STUDY_RE.finditer(text):
+        if m.lastindex == 1:
+            return "RCT"
+        if not best or m.lastindex < best:
+            best = m.lastindex
+    return _STUDY_LABELS[best]
 
 def _is_preprint(item: dict) -> bool:
-    host = (item.get("URL") or "").lower()
-    return any(h in host for h in ["medrxiv", "biorxiv", "arxiv"])
+    return _PREPRINT_RE.search((item.get("URL") or "").lower()) is not None
 
 def _first_str(x) -> str:
     if isinstance(x, list) and x:
         return x[0]
     return x or ""
 
+# Crossref date fields, most specific first
+_YEAR_KEYS = ("published-print", "published-online", "issued", "created")
+
 def _get_year(item: dict) -> Optional[int]:
-    for key in ["published-print", "published-online", "issued", "created"]:
-        d = item.get(key, {}).get("date-parts", [])
-        if d and len(d[0]) >= 1:
+    for key in _YEAR_KEYS:
+        dp = item.get(key)
+        if not dp:
+            continue
+        parts = dp.get("date-parts")
+        if parts and parts[0]:
+            y = parts[0][0]
+            if isinstance(y, int):
+                return y
             try:
-                return int(d[0][0])
-            except Exception:
+                return int(y)
+            except (TypeError, ValueError):
                 pass
     return None
 
-def _normalize_title(t: str) -> str:
-    t = t or ""
-    t = re.sub(r"\s+", " ", t).strip().lower()
-    return t
+# titles whose SimHash signatures differ in at most this many bits are near-duplicates
+TITLE_SIG_MAX_DIST = 3
+
+def _title_words(t: str) -> List[str]:
+    """Lower-cased title words, stopwords dropped, spelling and plurals folded."""
+    out = []
+    for w in _WORD_RE.findall((t or "").lower()):
+        if w in _TITLE_STOPWORDS:
+            continue
+        for rx, rep in _SPELLING_FOLDS:
+            w = rx.sub(rep, w)
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        out.append(w)
+    return out
+
+def _title_sig(t: str) -> int:
+    """
+    64-bit SimHash of a title over its folded words and word bigrams, so case,
+    punctuation, hyphenation, plural and British/US spelling variants collide,
+    while a changed word (term vs preterm) moves the signature well past
+    TITLE_SIG_MAX_DIST.
+
+    >>> d = lambda a, b: (_title_sig(a) ^ _title_sig(b)).bit_count()
+    >>> d("A randomized trial of kangaroo care", "A randomised trial of kangaroo care")
+    0
+    >>> d("Probiotics for diarrhoea in infants", "Probiotics for diarrhea in infant")
+    0
+    >>> d("Paediatric anaemia and behaviour", "Pediatric anemia and behavior.")
+    0
+    >>> d("Vitamin D in term infants", "Vitamin D in preterm infants") > TITLE_SIG_MAX_DIST
+    True
+    """
+    words = _title_words(t)
+    feats = Counter(words + [a + " " + b for a, b in zip(words, words[1:])])
+    v = [0] * 64
+    for g, w in feats.items():
+        h = int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big")
+        for b in range(64):
+            v[b] += w if (h >> b) & 1 else -w
+    return sum(1 << b for b in range(64) if v[b] > 0)
+
+def _near_dup(sig: int, seen_sigs: List[int]) -> bool:
+    # k is small (<= a dozen kept titles), so a linear Hamming scan is fine
+    return any((sig ^ s).bit_count() <= TITLE_SIG_MAX_DIST for s in seen_sigs)
 
 def crossref_search_papers(query: str, year_from: int, k: int = 6) -> List[DocItem]:
     """Query Crossref for papers and return top-k normalized items"""
     params = {
         "query": query,
-        "rows": max(10, k * 2),   # fetch a few extra for de-dupe
+        "rows": k + 4,   # a few extra for de-dupe (it rarely drops more than that)
         **_year_filter(year_from),
-        "select": "title,abstract,DOI,URL,issued,created,publisher,container-title,type",
+        # only what we read below (issued/created feed _get_year)
+        "select": "title,abstract,DOI,URL,issued,created",
         "sort": "score",
         "order": "desc",
     }
+    # Crossref's polite pool wants a mailto UA; otherwise the shared pooled session
     headers = {"User-Agent": UA}
 
-    r = requests.get(CROSSREF_URL, params=params, headers=headers, timeout=20)
-    r.raise_for_status()
-    items = r.json().get("message", {}).get("items", [])
+    # streamed, so an abnormal payload is cut off at the cap instead of buffered
+    with get_http_session().get(CROSSREF_URL, params=params, headers=headers,
+                                timeout=DEFAULT_TIMEOUT_SEC, stream=True) as r:
+        r.raise_for_status()
+        body = read_capped(r, MAX_CONTENT_LENGTH_BYTES)
+    if body is None:
+        raise ValueError(f"Crossref response over {MAX_CONTENT_LENGTH_BYTES} bytes or cut off")
+    # JSON is UTF-8; orjson parses the bytes directly (no charset sniffing)
+    data = orjson.loads(body) if _ORJSON_INSTALLED else json.loads(body)
+    items = data.get("message", {}).get("items", [])
 
-    seen_titles = set()
+    seen_sigs: List[int] = []
     seen_dois = set()
     out: List[DocItem] = []
 
@@ -94,17 +198,17 @@ def crossref_search_papers(query: str, year_from: int, k: int = 6) -> List[DocIt
         preprint = _is_preprint(it)
 
         # de-dupe
-        nt = _normalize_title(title)
         if doi and doi in seen_dois:
             continue
-        if nt in seen_titles:
+        sig = _title_sig(title)
+        if _near_dup(sig, seen_sigs):
             continue
 
         out.append(
             DocItem(
                 source_type="paper",
                 title=title,
-                snippet=re.sub("<.*?>", "", abstract)[:350] or None,
+                snippet=_TAG_RE.sub("", abstract)[:350] or None,
                 year=year,
                 url=url,
                 org=None,
@@ -115,7 +219,7 @@ def crossref_search_papers(query: str, year_from: int, k: int = 6) -> List[DocIt
             )
         )
         if doi: seen_dois.add(doi)
-        seen_titles.add(nt)
+        seen_sigs.append(sig)
         if len(out) >= k:
             break
 
@@ -134,23 +238,45 @@ def build_query(clean_query: str,
     parts.extend(["randomized", "trial", "meta-analysis"])
     return " ".join(parts)
 
+def _start_daemon(fn, *args) -> Future:
+    """
+    Runs fn(*args) on its own daemon thread and returns a Future for the result.
+    Per call, so callers never queue behind each other's abandoned queries, and
+    not an executor thread, which the interpreter would join at exit.
+    """
+    fut: Future = Future()
+    fut.set_running_or_notify_cancel()
+
+    def run() -> None:
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, name="crossref-widen", daemon=True).start()
+    return fut
+
 def retrieve_pico_papers(clean_query: str,
                          time_horizon_years: int = 5,
                          population: Optional[str] = None,
                          outcomes: Optional[List[str]] = None,
-                         k: int = 6) -> List[DocItem]:
-    year_from = datetime.utcnow().year - max(0, int(time_horizon_years))
+                         k: int = 6,
+                         current_year: Optional[int] = None) -> List[DocItem]:
+    # callers may pin the year (one value per request, or a frozen one in tests)
+    cur = current_year or datetime.utcnow().year
+    year_from = cur - max(0, int(time_horizon_years))
     q = build_query(clean_query, population, outcomes)
-    results = crossref_search_papers(q, year_from, k=k)
-
-    # If too few results, relax by widening years
+    # If too few results, relax by widening years. The widened query is issued
+    # alongside the first one, so a thin first page doesn't cost a second round trip;
+    # when the first page is enough its result is dropped without waiting for it.
+    f_wide = _start_daemon(crossref_search_papers, q, year_from - 5, k)
+    results = crossref_search_papers(q, year_from, k)
     if len(results) < max(3, k // 2):
-        results = crossref_search_papers(q, year_from - 5, k=k)
-
+        return f_wide.result()
     return results
 
 def to_dicts(items: List[DocItem]) -> List[dict]:
-    return [asdict(x) for x in items]
+    return [x.to_dict() for x in items]
 
 # ---- quick CLI demo ----
 # Usage:
@@ -1,14 +1,31 @@
 # backend/router_agent.py
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from typing import Literal, List, Optional
-import json, re, sys
+import asyncio, json, re, sys, threading
+from itertools import islice
 from openai import OpenAI
 
+from llm_async import chat_text
+from llm_cache import make_key, get_cached, put_cached
+
+# ---- optional fast JSON ----
+try:
+    import orjson  # type: ignore
+    _ORJSON_INSTALLED = True
+except Exception:
+    _ORJSON_INSTALLED = False
+
 MODEL = "gpt-4.1-mini"   # small, inexpensive model is fine here
 
+# in-process memo of LLM routes, keyed on the normalized query (most recently used last)
+ROUTE_CACHE_MAX = 256
+_ROUTE_CACHE: "OrderedDict[str, RouterOutput]" = OrderedDict()
+_ROUTE_CACHE_LOCK = threading.Lock()
+
 TaskType = Literal["PICO_EVIDENCE", "GUIDELINE_COMPARE", "CLARIFY"]
 
-@dataclass
+@dataclass(slots=True)
 class RouterOutput:
     task_type: TaskType
     clean_query: str
@@ -45,12 +62,35 @@ Return ONLY JSON like:
 """
 
 # --------- tiny regex+heuristic fallback if the LLM ever fails ----------
+# every keyword the fallback looks for, matched in one pass; the group name says
+# what it signals. Short tokens (who/cdc/us/rct/...) need word boundaries.
+_FALLBACK_KW_RE = re.compile(
+    r"(?P<guideline>guideline|recommendation|policy|schedule)"
+    r"|(?P<who>\bwho\b)"
+    r"|(?P<cdc>\bcdc\b)"
+    r"|(?P<us>united states|\bus\b)"
+    r"|(?P<canada>canada|\bcps\b)"
+    r"|(?P<pico>does|effect|impact|reduce|increase|trial|\brct\b|meta-analysis)"
+    r"|(?P<preterm>preterm|pre-term)"
+    r"|(?P<term>term infant|term baby)"
+    r"|(?P<m0_6>(?<!\d)0\s*(?:-|to)\s*6(?!\d))"
+    r"|(?P<m6_12>(?<!\d)6\s*(?:-|to)\s*12(?!\d))"
+    r"|(?P<units>\biu\b|vitamin d)"
+    r"|(?P<diarrhea>diarrhea|gastroenteritis)"
+    r"|(?P<los>length of stay|\blos\b)"
+    r"|(?P<ohd>25ohd|25-hydroxy)"
+)
+
+# en/em dashes -> "-", so the age ranges above need one spelling
+_DASH_TRANS = str.maketrans({"–": "-", "—": "-"})
+
 def _rule_fallback(user_query: str) -> RouterOutput:
     q = user_query.strip()
-    ql = q.lower()
+    ql = q.lower().translate(_DASH_TRANS)
+    hits = {m.lastgroup for m in _FALLBACK_KW_RE.finditer(ql)}
     # naive guesses
-    is_guideline = any(k in ql for k in ["guideline", "recommendation", "policy", "schedule", "who", "cdc"])
-    is_pico = any(k in ql for k in ["does", "effect", "impact", "reduce", "increase", "trial", "rct", "meta-analysis"])
+    is_guideline = bool(hits & {"guideline", "who", "cdc"})
+    is_pico = "pico" in hits
     task: TaskType = "CLARIFY"
     if is_guideline:
         task = "GUIDELINE_COMPARE"
@@ -59,22 +99,22 @@ def _rule_fallback(user_query: str) -> RouterOutput:
 
     need_support = (task == "GUIDELINE_COMPARE")
     population = None
-    if any(k in ql for k in ["preterm", "pre-term"]): population = "preterm"
-    elif any(k in ql for k in ["term infant", "term baby"]): population = "term"
-    elif any(k in ql for k in ["0-6", "0–6", "0 to 6", "0 – 6"]): population = "0–6m"
-    elif any(k in ql for k in ["6-12", "6–12", "6 to 12", "6 – 12"]): population = "6–12m"
+    if "preterm" in hits: population = "preterm"
+    elif "term" in hits: population = "term"
+    elif "m0_6" in hits: population = "0–6m"
+    elif "m6_12" in hits: population = "6–12m"
 
     geography = None
-    if "who" in ql: geography = "WHO"
-    elif "cdc" in ql or "united states" in ql or "us" in ql: geography = "US/CDC"
-    elif "canada" in ql or "cps" in ql: geography = "Canada/CPS"
+    if "who" in hits: geography = "WHO"
+    elif "cdc" in hits or "us" in hits: geography = "US/CDC"
+    elif "canada" in hits: geography = "Canada/CPS"
 
-    units_hint = "IU/day" if "iu" in ql or "vitamin d" in ql else None
+    units_hint = "IU/day" if "units" in hits else None
 
     outcomes: List[str] = []
-    if any(k in ql for k in ["diarrhea", "gastroenteritis"]): outcomes.append("diarrhea")
-    if any(k in ql for k in ["length of stay", "los"]): outcomes.append("length of stay")
-    if any(k in ql for k in ["25ohd", "25-hydroxy", "25-hydroxyvitamin d"]): outcomes.append("25OHD")
+    if "diarrhea" in hits: outcomes.append("diarrhea")
+    if "los" in hits: outcomes.append("length of stay")
+    if "ohd" in hits: outcomes.append("25OHD")
 
     clarify: List[str] = []
     if task == "GUIDELINE_COMPARE" and geography is None:
@@ -95,41 +135,127 @@ def _rule_fallback(user_query: str) -> RouterOutput:
         clarify=clarify
     )
 
+def _route_key(user_query: str) -> str:
+    # case/whitespace variants of the same question share one route
+    return " ".join(user_query.casefold().split())
+
+def _copy_route(out: RouterOutput) -> RouterOutput:
+    # callers get their own lists, so the cached route can't be mutated
+    return replace(out, outcomes=list(out.outcomes), clarify=list(out.clarify))
+
+def _memo_get(key: str) -> Optional[RouterOutput]:
+    with _ROUTE_CACHE_LOCK:
+        hit = _ROUTE_CACHE.get(key)
+        if hit is None:
+            return None
+        _ROUTE_CACHE.move_to_end(key)
+        return _copy_route(hit)
+
+def _memo_put(key: str, out: RouterOutput) -> None:
+    with _ROUTE_CACHE_LOCK:
+        _ROUTE_CACHE[key] = _copy_route(out)
+        if len(_ROUTE_CACHE) > ROUTE_CACHE_MAX:
+            _ROUTE_CACHE.popitem(last=False)
+
 def route_query(user_query: str) -> RouterOutput:
-    client = OpenAI()
-    try:
-        resp = client.chat.completions.create(
-            model=MODEL,
-            temperature=0,
-            messages=[
-                {"role":"system", "content": SYSTEM},
-                {"role":"user", "content": user_query}
-            ]
-        )
-        text = resp.choices[0].message.content.strip()
-        # extract first {...} in case model adds anything
-        match = re.search(r"\{.*\}", text, re.S)
-        data = json.loads(match.group(0) if match else text)
-
-        # defaults & safety
-        task = data.get("task_type", "CLARIFY")
-        need_support = bool(data.get("need_supporting_evidence", task == "GUIDELINE_COMPARE"))
-
-        return RouterOutput(
-            task_type=task,  # type: ignore[arg-type]
-            clean_query=data.get("clean_query", user_query.strip()),
-            time_horizon_years=int(data.get("time_horizon_years", 5)),
-            need_supporting_evidence=need_support,
-            population=data.get("population"),
-            geography=data.get("geography"),
-            outcomes=list(data.get("outcomes", []))[:3],
-            units_hint=data.get("units_hint"),
-            confidence=float(data.get("confidence", 0.0)),
-            clarify=list(data.get("clarify", []))[:2],
-        )
-    except Exception:
+    """
+    LLM routing, memoized per normalized query. Only LLM results are cached;
+    the rule fallback is cheap and a failed call should be retried next time.
+    """
+    key = _route_key(user_query)
+    hit = _memo_get(key)
+    if hit is not None:
+        return hit
+
+    out = _route_with_llm(user_query)
+    if out is None:
         # Safe fallback
         return _rule_fallback(user_query)
+    _memo_put(key, out)
+    return out
+
+async def route_query_async(user_query: str) -> RouterOutput:
+    """
+    route_query for async callers: the completion is awaited on the shared
+    AsyncOpenAI client, so many routes can be in flight on one thread.
+    """
+    key = _route_key(user_query)
+    hit = _memo_get(key)
+    if hit is not None:
+        return hit
+
+    out = await _route_with_llm_async(user_query)
+    if out is None:
+        return _rule_fallback(user_query)
+    _memo_put(key, out)
+    return out
+
+def _llm_request(user_query: str) -> dict:
+    return {
+        "model": MODEL,
+        "temperature": 0,
+        # JSON mode: the reply is a single JSON object, nothing to dig out of prose
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role":"system", "content": SYSTEM},
+            {"role":"user", "content": user_query}
+        ],
+    }
+
+def _route_with_llm(user_query: str) -> Optional[RouterOutput]:
+    key = make_key(MODEL, SYSTEM, user_query, 0)
+    text = get_cached(key)
+    fresh = text is None
+    try:
+        if fresh:
+            client = OpenAI()
+            resp = client.chat.completions.create(**_llm_request(user_query))
+            text = resp.choices[0].message.content.strip()
+        out = _parse_route(text, user_query)
+    except Exception:
+        return None
+    # store new replies only, and only once they parse (a hit keeps its expiry)
+    if fresh:
+        put_cached(key, text)
+    return out
+
+async def _route_with_llm_async(user_query: str) -> Optional[RouterOutput]:
+    key = make_key(MODEL, SYSTEM, user_query, 0)
+    # the cache takes a threading lock and hits sqlite; keep both off the event loop
+    text = await asyncio.to_thread(get_cached, key)
+    fresh = text is None
+    try:
+        if fresh:
+            text = await chat_text(**_llm_request(user_query))
+        out = _parse_route(text, user_query)
+    except Exception:
+        return None
+    if fresh:
+        await asyncio.to_thread(put_cached, key, text)
+    return out
+
+def _parse_route(text: str, user_query: str) -> RouterOutput:
+    data = orjson.loads(text) if _ORJSON_INSTALLED else json.loads(text)
+
+    # defaults & safety; the label-like fields come from a handful of values,
+    # so intern them (fresh strings from every parsed reply otherwise)
+    task = sys.intern(str(data.get("task_type") or "CLARIFY"))
+    population = data.get("population")
+    geography = data.get("geography")
+    need_support = bool(data.get("need_supporting_evidence", task == "GUIDELINE_COMPARE"))
+
+    return RouterOutput(
+        task_type=task,  # type: ignore[arg-type]
+        clean_query=data.get("clean_query", user_query.strip()),
+        time_horizon_years=int(data.get("time_horizon_years", 5)),
+        need_supporting_evidence=need_support,
+        population=sys.intern(population) if isinstance(population, str) else population,
+        geography=sys.intern(geography) if isinstance(geography, str) else geography,
+        outcomes=list(islice(data.get("outcomes") or (), 3)),
+        units_hint=data.get("units_hint"),
+        confidence=float(data.get("confidence", 0.0)),
+        clarify=list(islice(data.get("clarify") or (), 2)),
+    )
 
 # --- quick CLI test: `python backend/router_agent.py "your question"`
 if __name__ == "__main__":
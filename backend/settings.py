@@ -14,6 +14,18 @@ def _get_bool(name: str, default: bool) -> bool:
 # ---- caching ----
 ENABLE_HTTP_CACHE: bool = _get_bool("ENABLE_HTTP_CACHE", True)
 CACHE_BACKEND_PATH: str = os.getenv("CACHE_BACKEND_PATH", ".http_cache")
+# "sqlite" persists across runs; "memory" keeps hits in-process (no disk I/O or
+# sqlite locking) for one-off/ephemeral runs
+HTTP_CACHE_BACKEND: str = os.getenv("HTTP_CACHE_BACKEND", "sqlite").strip().lower()
+# Crossref search results change slowly; keep them longer than the 6h default
+CROSSREF_CACHE_TTL_SEC: int = int(os.getenv("CROSSREF_CACHE_TTL_SEC", "86400"))  # 1 day
+
+# exact-match chat completion cache (llm_cache.py)
+ENABLE_LLM_CACHE: bool = _get_bool("ENABLE_LLM_CACHE", True)
+LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+LLM_CACHE_TTL_SEC: int = int(os.getenv("LLM_CACHE_TTL_SEC", str(7 * 86400)))  # 1 week
+# max in-flight completions from the async entry points (llm_async.py)
+LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "10"))
 
 # ---- network timeouts & retries ----
 DEFAULT_TIMEOUT_SEC: float = float(os.getenv("DEFAULT_TIMEOUT_SEC", "12.0"))
@@ -21,12 +33,21 @@ TOTAL_RETRIES: int = int(os.getenv("TOTAL_RETRIES", "3"))
 BACKOFF_FACTOR: float = float(os.getenv("BACKOFF_FACTOR", "0.5"))
 
 # ---- rate limit (per host) ----
-# e.g., 0.5 => at most one request every 2 seconds per host
+# sustained rate, e.g., 0.5 => one request every 2 seconds per host on average
+# (after an initial burst of PER_HOST_BURST back-to-back requests)
 PER_HOST_MAX_RPS: float = float(os.getenv("PER_HOST_MAX_RPS", "0.5"))
+# requests a host may receive back-to-back before the rate above kicks in
+PER_HOST_BURST: float = float(os.getenv("PER_HOST_BURST", "2"))
+# max simultaneous in-flight requests per host
+PER_HOST_MAX_CONC: int = int(os.getenv("PER_HOST_MAX_CONC", "2"))
 
 # ---- robots ----
 RESPECT_ROBOTS: bool = _get_bool("RESPECT_ROBOTS", True)
 ROBOTS_TTL_SEC: int = int(os.getenv("ROBOTS_TTL_SEC", "86400"))  # 1 day
+# hosts we query on every request and never need a robots.txt lookup for (comma-separated)
+ALWAYS_ALLOWED_HOSTS: frozenset = frozenset(
+    h.strip().lower() for h in os.getenv("ALWAYS_ALLOWED_HOSTS", "duckduckgo.com").split(",") if h.strip()
+)
 
 # ---- user agent ----
 USER_AGENT: str = os.getenv(
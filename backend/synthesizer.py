@@ -2,7 +2,17 @@
 from __future__ import annotations
 from typing import List, Dict, Any, Literal
 from openai import OpenAI
-import textwrap, json
+import asyncio, textwrap, json
+
+from llm_async import chat_text
+from llm_cache import make_key, get_cached, put_cached
+
+# ---- optional fast JSON ----
+try:
+    import orjson  # type: ignore
+    _ORJSON_INSTALLED = True
+except Exception:
+    _ORJSON_INSTALLED = False
 
 MODEL = "gpt-4.1-mini"
 TaskType = Literal["PICO_EVIDENCE", "GUIDELINE_COMPARE", "CLARIFY"]
@@ -14,7 +24,7 @@ Never give medical advice; include this banner verbatim at the end:
 Rules:
 - 130 words max for the summary.
 - Use only the provided items (papers/guidelines/web).
-- Cite using bracket numbers [1], [2] that match the Sources list.
+- Cite using bracket numbers [1], [2] that match the items' "n" (the Sources list order).
 - If evidence conflicts, say so explicitly.
 - Prefer recent/high-quality sources (RCTs, meta-analyses; official orgs).
 """
@@ -49,14 +59,22 @@ def _table_prompt(task_type: TaskType) -> str:
         Fill only with paper items.
         """)
 
-def synthesize(task_type: TaskType,
-               route_meta: Dict[str, Any],
-               items: List[Dict[str, Any]]) -> Dict[str, str]:
+def _build_prompt(task_type: TaskType,
+                  route_meta: Dict[str, Any],
+                  items: List[Dict[str, Any]]) -> tuple[str, str]:
+    """
+    Returns (user_prompt, sources_text). The numbered Sources list is not sent
+    to the model (the payload already carries every field in it); callers
+    append it to the reply instead.
+    """
     # Keep numbering stable
     payload = []
-    for it in items:
+    for i, it in enumerate(items, start=1):
         payload.append({
+            "n": i,
             "source_type": it.get("source_type"),
+            # every retriever that returned this URL (main_agent merges repeats)
+            "source_types": it.get("source_types"),
             "title": it.get("title"),
             "year": it.get("year"),
             "org": it.get("org"),
@@ -75,6 +93,11 @@ def synthesize(task_type: TaskType,
     if route_meta.get("units_hint"): meta_bits.append(f"Units: {route_meta['units_hint']}")
     meta_line = " | ".join(meta_bits) if meta_bits else "Context: general infant/child health"
 
+    # same text either way (non-ASCII kept, 2-space indent), so cache keys match
+    if _ORJSON_INSTALLED:
+        payload_json = orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()
+    else:
+        payload_json = json.dumps(payload, ensure_ascii=False, indent=2)
     sources_text = _format_sources(payload)
     table_instr = _table_prompt(task_type)
 
@@ -82,22 +105,54 @@ def synthesize(task_type: TaskType,
     Task type: {task_type}
     {meta_line}
 
-    Provided items (numbered for citation order):
-    {json.dumps(payload, ensure_ascii=False, indent=2)}
+    Provided items (cite item n as [n]):
+    {payload_json}
 
     Write a 3–5 sentence summary (<=130 words), neutral tone, cite with [#].
     {table_instr}
 
     End with the fixed banner: ⚠️ Research synthesis for information only — not medical advice.
+    Do not output a Sources list; it is appended for you.
+    """
 
-    After summary and table, output a section:
-    Sources:
-    {sources_text}
+    return user_prompt, sources_text
+
+def _with_sources(text: str, sources_text: str) -> str:
+    return f"{text}\n\nSources:\n{sources_text}" if sources_text else text
+
+def _llm_request(user_prompt: str) -> Dict[str, Any]:
+    return {
+        "model": MODEL, "temperature": 0.2,
+        "messages": [{"role":"system","content":SYSTEM},{"role":"user","content":user_prompt}],
+    }
+
+def synthesize(task_type: TaskType,
+               route_meta: Dict[str, Any],
+               items: List[Dict[str, Any]]) -> Dict[str, str]:
+    user_prompt, sources_text = _build_prompt(task_type, route_meta, items)
+
+    # identical items + route meta give an identical prompt; replay the summary
+    key = make_key(MODEL, SYSTEM, user_prompt, 0.2)
+    text = get_cached(key)
+    if text is None:
+        client = OpenAI()
+        resp = client.chat.completions.create(**_llm_request(user_prompt))
+        text = resp.choices[0].message.content.strip()
+        put_cached(key, text)
+    return {"summary_block": _with_sources(text, sources_text)}
+
+async def synthesize_async(task_type: TaskType,
+                           route_meta: Dict[str, Any],
+                           items: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    synthesize for async callers (awaits the shared AsyncOpenAI client).
     """
+    user_prompt, sources_text = _build_prompt(task_type, route_meta, items)
 
-    client = OpenAI()
-    resp = client.chat.completions.create(
-        model=MODEL, temperature=0.2,
-        messages=[{"role":"system","content":SYSTEM},{"role":"user","content":user_prompt}]
-    )
-    return {"summary_block": resp.choices[0].message.content.strip()}
+    key = make_key(MODEL, SYSTEM, user_prompt, 0.2)
+    # sqlite + a threading lock behind the cache; run them on a worker thread
+    text = await asyncio.to_thread(get_cached, key)
+    if text is None:
+        text = await chat_text(**_llm_request(user_prompt))
+        await asyncio.to_thread(put_cached, key, text)
+    return {"summary_block": _with_sources(text, sources_text)}
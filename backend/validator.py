@@ -7,32 +7,39 @@ import re
 BANNER = "⚠️ Research synthesis for information only — not medical advice."
 
 PREPRINT_HINTS = ("medrxiv.org", "biorxiv.org", "arxiv.org", "ssrn.com", "researchsquare.com", "osf.io", "morressier")
+# all hints in one alternation: one scan of the URL instead of one per hint
+_PREPRINT_RE = re.compile("|".join(re.escape(h) for h in PREPRINT_HINTS))
+
+_CITE_RE = re.compile(r"\[(\d+)\]")
+# header of the Sources list the synthesizer appends; its "[n] ..." lines are not citations
+_SOURCES_HEADER = "\n\nSources:\n"
 
 def _citations_in_text(text: str) -> List[int]:
-    return sorted({int(n) for n in re.findall(r"\[(\d+)\]", text)})
+    return sorted({int(m.group(1)) for m in _CITE_RE.finditer(text)})
 
 def _out_of_range_cites(used: List[int], max_idx: int) -> List[int]:
     return [i for i in used if i < 1 or i > max_idx]
 
 def _is_preprint(url: str | None) -> bool:
-    if not url:
-        return False
-    u = url.lower()
-    return any(h in u for h in PREPRINT_HINTS)
+    return bool(url) and _PREPRINT_RE.search(url.lower()) is not None
 
-def validate(summary_block: str, items: List[Dict[str, Any]], time_horizon_years: int = 5) -> Dict[str, Any]:
+def validate(summary_block: str, items: List[Dict[str, Any]], time_horizon_years: int = 5,
+             current_year: int | None = None) -> Dict[str, Any]:
     """
     Ensures:
-      - bracket citations map to available sources
+      - bracket citations map to available sources (only the summary text is
+        checked; a trailing "Sources:" list is ignored)
       - recency warnings (> time_horizon_years)
       - preprints flagged
       - banner present (idempotent)
+    current_year defaults to the current UTC year.
     Returns: {"validated_text": str, "issues": [str]}
     """
     issues: List[str] = []
 
     # 1) citation coverage
-    used = _citations_in_text(summary_block)
+    body, sep, _ = summary_block.rpartition(_SOURCES_HEADER)
+    used = _citations_in_text(body if sep else summary_block)
     max_idx = len(items)
     oob = _out_of_range_cites(used, max_idx)
     if oob:
@@ -41,14 +48,21 @@ def validate(summary_block: str, items: List[Dict[str, Any]], time_horizon_years
     if not used and max_idx > 0:
         issues.append("No bracket citations [#] found in summary.")
 
-    # 2) recency
-    cur = datetime.utcnow().year
-    old_years = sorted({it.get("year") for it in items if it.get("year") and cur - int(it["year"]) > time_horizon_years})
+    # 2) recency and 3) preprints, gathered in one pass over the items
+    cur = current_year or datetime.utcnow().year
+    old_years = set()
+    any_preprint = False
+    for it in items:
+        y = it.get("year")
+        if y and cur - int(y) > time_horizon_years:
+            old_years.add(y)
+        if not any_preprint and _is_preprint(it.get("url")):
+            any_preprint = True
+
     if old_years:
-        issues.append(f"Some sources older than {time_horizon_years} years: {old_years}")
+        issues.append(f"Some sources older than {time_horizon_years} years: {sorted(old_years)}")
 
-    # 3) preprints
-    if any(_is_preprint(it.get("url")) for it in items):
+    if any_preprint:
         issues.append("Includes preprint/abstract host(s); interpret cautiously.")
 
     # 4) ensure banner